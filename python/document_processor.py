@@ -3,21 +3,50 @@ import sys
 import json
 import requests
 import io
-from typing import List, Dict, Any
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator
+import httpx
 import openai
 from pymongo import MongoClient
+from bson import ObjectId
+from bson.binary import Binary
 from pinecone import Pinecone
 import numpy as np
 from datetime import datetime
 from dotenv import load_dotenv
 from docx import Document
 import re
+import time
+import shutil
+import tempfile
 import PyPDF2
 import pdfplumber
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # 加载环境变量
 load_dotenv('../.env.local')
 
+# 模块加载时预编译正则与句子终止符集合，避免每次调用重新查找
+_RE_NL = re.compile(r'\n+')
+_SENT_TERMS = frozenset('。！？\n')
+
+# 按句子终止符单遍扫描切分文本（替代正则split，无回溯开销）
+def _split_sentences(text: str) -> List[str]:
+    sentences = []
+    buf = []
+    for ch in text:
+        if ch in _SENT_TERMS:
+            if buf:
+                sentences.append(''.join(buf))
+                buf = []
+        else:
+            buf.append(ch)
+    if buf:
+        sentences.append(''.join(buf))
+    return sentences
+
 class DocumentProcessor:
     # 初始化DocumentProcessor类
     def __init__(self):
@@ -26,10 +55,20 @@ class DocumentProcessor:
         if not siliconflow_api_key:
             raise ValueError("SILICONFLOW_API_KEY not found in environment variables")
         
+        # 预配置的httpx客户端：保持长连接，避免每个嵌入批次重新TLS握手
+        # （httpx客户端线程安全，可被嵌入线程池的所有线程共享）
+        limits = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+        try:
+            # HTTP/2可在单连接上多路复用并发批次（需要h2包）
+            http_client = httpx.Client(http2=True, limits=limits, timeout=30.0)
+        except ImportError:
+            http_client = httpx.Client(limits=limits, timeout=30.0)
+
         # 初始化SiliconFlow客户端（使用OpenAI客户端和自定义基础URL）
         self.client = openai.OpenAI(
             api_key=siliconflow_api_key,
-            base_url="https://api.siliconflow.cn/v1"
+            base_url="https://api.siliconflow.cn/v1",
+            http_client=http_client
         )
         
         # 初始化MongoDB
@@ -38,20 +77,66 @@ class DocumentProcessor:
         self.db = self.mongo_client['allpassagent']
         self.documents_collection = self.db['documents']
         self.vectors_collection = self.db['vectors']
+
+        # vectorized字段索引：使未处理文档的{'vectorized': {'$ne': True}}查询
+        # 走索引边界扫描而非全表扫描。注意不能用partialFilterExpression，
+        # MongoDB的部分索引不支持$ne谓词，且待处理文档多数根本没有该字段
+        try:
+            self.documents_collection.create_index(
+                [('vectorized', 1)],
+                background=True
+            )
+        except Exception as e:
+            print(f"Warning: failed to create index on documents.vectorized: {e}")
         
         # 初始化Pinecone (使用新版本API)
+        # pool_threads：REST客户端默认只有1个工作线程，async_req的批次会
+        # 串行排队；放大到10与_upsert_in_batches的并发批次数匹配
         pc = Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
-        self.index = pc.Index(os.getenv('PINECONE_INDEX_NAME'))
+        self.index = pc.Index(os.getenv('PINECONE_INDEX_NAME'), pool_threads=10)
+
+        # 每次嵌入API调用包含的文本数量（BAAI/bge服务端支持批量输入）
+        self.embedding_batch_size = 32
+
+        # 可选的本地嵌入后端：EMBEDDING_BACKEND=local时加载本地BGE模型，
+        # 批量前向推理免去逐批网络往返；不可用时回退到SiliconFlow远程调用
+        self.embedding_backend = os.getenv('EMBEDDING_BACKEND', 'siliconflow')
+        self.local_embedding_model = None
+        if self.embedding_backend == 'local':
+            try:
+                from FlagEmbedding import FlagModel
+                self.local_embedding_model = FlagModel('BAAI/bge-large-zh-v1.5', use_fp16=True)
+            except Exception as e:
+                print(f"Warning: local embedding backend unavailable ({e}), falling back to SiliconFlow")
+                self.embedding_backend = 'siliconflow'
+
+        # 嵌入批次的并发数（I/O密集，线程池可重叠网络延迟；注意服务商限流）
+        self.embedding_concurrency = int(os.getenv('EMBEDDING_CONCURRENCY', '8'))
+        self._embedding_executor = ThreadPoolExecutor(max_workers=self.embedding_concurrency)
+
+        # 查询嵌入的LRU缓存（按查询文本缓存，上限1024条）
+        self._query_embedding_cache = OrderedDict()
+
+        # 复用HTTP连接下载文档，避免每次下载重新进行TCP+TLS握手
+        self.http = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=32,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+        )
+        self.http.mount('http://', adapter)
+        self.http.mount('https://', adapter)
+        self.http.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Accept-Encoding': 'gzip, deflate'
+        })
     
     # 从URL下载并解析PDF文件
     def download_and_parse_pdf(self, file_url: str) -> List[str]:
         """从URL下载并解析PDF文件"""
         try:
-            # 下载文件，禁用SSL验证并使用自定义请求头
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(file_url, headers=headers, verify=False, timeout=30)
+            # 通过会话下载文件（复用连接），禁用SSL验证
+            response = self.http.get(file_url, verify=False, timeout=30)
             response.raise_for_status()
             
             # 使用pdfplumber解析PDF文件（更好的文本提取效果）
@@ -72,104 +157,132 @@ class DocumentProcessor:
                         full_text += page_text + "\n"
             
             # 清理文本
-            full_text = re.sub(r'\n+', '\n', full_text)
+            full_text = _RE_NL.sub('\n', full_text)
             full_text = full_text.strip()
-            
+
             if not full_text:
                 print("Warning: No text extracted from PDF")
                 return []
             
-            # 分割成块（每块大约500个字符）
-            chunks = []
-            chunk_size = 500
-            overlap = 50
-            
-            sentences = re.split(r'[。！？\n]', full_text)
-            current_chunk = ""
-            
-            for sentence in sentences:
-                sentence = sentence.strip()
-                if not sentence:
-                    continue
-                    
-                if len(current_chunk) + len(sentence) < chunk_size:
-                    current_chunk += sentence + "。"
-                else:
-                    if current_chunk:
-                        chunks.append(current_chunk.strip())
-                    current_chunk = sentence + "。"
-            
-            # 添加最后一个块
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-            
+            # 按句子边界分块（前缀和确定块边界，每块大约500个字符）
+            chunks = self._sentence_window_chunks(full_text)
+
             return chunks
-            
+
         except Exception as e:
             print(f"Error downloading and parsing PDF: {e}")
             return []
 
+    # 句子级滑动窗口分块：前缀和+二分定位块边界，避免逐句字符串累加
+    def _sentence_window_chunks(self, text: str, chunk_size: int = 500, overlap_sentences: int = 1) -> List[str]:
+        """按句子切分后用长度前缀和定位块边界，每块一次join，相邻块重叠若干句"""
+        sentences = [s.strip() for s in _split_sentences(text)]
+        sentences = [s for s in sentences if s]
+        if not sentences:
+            return []
+
+        # 各句长度（含补回的句号）的前缀和，searchsorted直接定位不超过chunk_size的最远句
+        lens = np.fromiter((len(s) + 1 for s in sentences), dtype=np.int64)
+        cum = np.cumsum(lens)
+
+        chunks = []
+        n = len(sentences)
+        i = 0
+        while i < n:
+            base = int(cum[i - 1]) if i > 0 else 0
+            j = int(np.searchsorted(cum, base + chunk_size, side='right'))
+            if j <= i:
+                j = i + 1  # 单句超长时也要前进，整句作为一个块
+            chunks.append('。'.join(sentences[i:j]) + '。')
+            if j >= n:
+                break
+            i = max(j - overlap_sentences, i + 1)
+        return chunks
+
     # 从URL下载并解析docx文件
     def download_and_parse_docx(self, file_url: str) -> List[str]:
         """从URL下载并解析docx文件"""
         try:
-            # 下载文件，禁用SSL验证并使用自定义请求头
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(file_url, headers=headers, verify=False, timeout=30)
-            response.raise_for_status()
-            
+            # 流式下载到SpooledTemporaryFile（超过8MB落盘），避免整份文件在内存中双份驻留
+            with self.http.get(file_url, verify=False, timeout=30, stream=True) as response:
+                response.raise_for_status()
+                buf = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+                # 直接读response.raw会绕过urllib3的透明解压；显式打开
+                # decode_content，服务器返回gzip时写入的才是解压后的字节
+                response.raw.decode_content = True
+                shutil.copyfileobj(response.raw, buf)
+                buf.seek(0)
+
             # 解析docx文件
-            doc = Document(io.BytesIO(response.content))
-            
+            doc = Document(buf)
+
+            # 收集非空文本后一次join，避免逐段字符串拼接的O(n²)开销
+            parts = []
+
             # 从所有段落中提取文本
-            full_text = ""
             for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    full_text += paragraph.text + "\n"
-            
+                text = paragraph.text.strip()
+                if text:
+                    parts.append(text)
+
             # 从表格中提取文本
             for table in doc.tables:
                 for row in table.rows:
                     for cell in row.cells:
-                        if cell.text.strip():
-                            full_text += cell.text + "\n"
-            
-            # 清理文本
-            full_text = re.sub(r'\n+', '\n', full_text)
-            full_text = full_text.strip()
-            
-            # 分割成块（每块大约500个字符）
-            chunks = []
-            chunk_size = 500
-            overlap = 50
-            
-            sentences = re.split(r'[。！？\n]', full_text)
-            current_chunk = ""
-            
-            for sentence in sentences:
-                sentence = sentence.strip()
-                if not sentence:
-                    continue
-                    
-                if len(current_chunk) + len(sentence) < chunk_size:
-                    current_chunk += sentence + "。"
-                else:
-                    if current_chunk:
-                        chunks.append(current_chunk.strip())
-                    current_chunk = sentence + "。"
-            
-            # 添加最后一个块
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-            
+                        text = cell.text.strip()
+                        if text:
+                            parts.append(text)
+
+            # 空段落已在收集时过滤，无需再做正则清理
+            full_text = "\n".join(parts)
+
+            # 固定步长滑动窗口分块（块长500，步长375，即25%重叠）
+            chunks = self._sliding_window_chunks(full_text)
+
             return chunks
-            
+
         except Exception as e:
             print(f"Error downloading and parsing docx: {e}")
             return []
+
+    # 固定步长的滑动窗口分块：纯切片操作，块长与重叠确定
+    def _sliding_window_chunks(self, text: str, chunk_size: int = 500, stride: int = 375) -> List[str]:
+        """按固定窗口大小和步长对文本切块，窗口尾部向后对齐到最近的句子边界（≤50字符）"""
+        if not text:
+            return []
+
+        chunks = []
+        text_len = len(text)
+        for start in range(0, text_len, stride):
+            end = start + chunk_size
+            if end < text_len:
+                # 向后扫描不超过50个字符，尽量在句子边界处截断
+                boundary = -1
+                for offset in range(min(50, text_len - end)):
+                    if text[end + offset] in '。！？\n':
+                        boundary = end + offset + 1
+                        break
+                if boundary != -1:
+                    end = boundary
+            chunk = text[start:end].strip()
+            if chunk:
+                chunks.append(chunk)
+            if end >= text_len:
+                break
+        return chunks
     
+    # 分批并行上传向量到Pinecone（单次请求有约100个向量/2MB的限制）
+    def _upsert_in_batches(self, vectors: List[Dict[str, Any]], batch_size: int = 100):
+        """分批上传向量到Pinecone，使用async_req并行发送各批次"""
+        async_results = []
+        for start in range(0, len(vectors), batch_size):
+            batch = vectors[start:start + batch_size]
+            async_results.append(self.index.upsert(vectors=batch, async_req=True))
+
+        # 等待所有批次完成（任一失败会在此抛出）
+        for async_result in async_results:
+            async_result.result()
+
     # 处理URL文档：下载、解析、生成嵌入向量并存储到Pinecone
     def process_url_document(self, file_url: str, filename: str = None) -> Dict[str, Any]:
         """ 处理URL文档：下载、解析、生成嵌入向量并存储到Pinecone"""
@@ -193,22 +306,10 @@ class DocumentProcessor:
             if not chunks:
                 return {'error': 'Failed to download or parse document'}
             
-            # 在MongoDB中创建文档记录
-            document_record = {
-                'filename': filename,
-                'fileUrl': file_url,
-                'fileType': file_type,
-                'uploadedAt': datetime.utcnow(),
-                'processed': False,
-                'vectorized': False,
-                'chunks': chunks,
-                'chunkCount': len(chunks)
-            }
-            
-            # 将文档插入MongoDB
-            result = self.documents_collection.insert_one(document_record)
-            document_id = str(result.inserted_id)
-            
+            # 客户端生成文档ID，文档记录在处理成功后一次性写入（省去后续update_one）
+            object_id = ObjectId()
+            document_id = str(object_id)
+
             # 为所有块生成嵌入向量
             embeddings = self.generate_embeddings(chunks)
             if not embeddings:
@@ -246,30 +347,33 @@ class DocumentProcessor:
                     'document_id': document_id,
                     'chunk_index': i,
                     'content': chunk,
-                    'embedding': embedding,
+                    # float32二进制存储，体积仅为浮点列表的一半左右（检索走Pinecone，Mongo仅留档）
+                    'embedding': Binary(np.asarray(embedding, dtype=np.float32).tobytes()),
                     'created_at': datetime.utcnow()
                 })
             
-            # 上传到Pinecone
-            self.index.upsert(vectors=vectors_to_upsert)
-            
-            # 存储到MongoDB
+            # 分批上传到Pinecone
+            self._upsert_in_batches(vectors_to_upsert)
+
+            # 存储到MongoDB（无序插入，互不阻塞）
             if vector_records:
-                self.vectors_collection.insert_many(vector_records)
-            
-            # 更新文档状态
-            self.documents_collection.update_one(
-                {'_id': result.inserted_id},
-                {
-                    '$set': {
-                        'vectorized': True,
-                        'processed': True,
-                        'processed_at': datetime.utcnow(),
-                        'vector_count': len(embeddings)
-                    }
-                }
-            )
-            
+                self.vectors_collection.insert_many(vector_records, ordered=False)
+
+            # 文档记录带最终状态一次性写入，替代insert_one + update_one两次往返
+            self.documents_collection.insert_one({
+                '_id': object_id,
+                'filename': filename,
+                'fileUrl': file_url,
+                'fileType': file_type,
+                'uploadedAt': datetime.utcnow(),
+                'processed': True,
+                'vectorized': True,
+                'chunks': chunks,
+                'chunkCount': len(chunks),
+                'processed_at': datetime.utcnow(),
+                'vector_count': len(embeddings)
+            })
+
             return {
                 'success': True,
                 'document_id': document_id,
@@ -283,50 +387,79 @@ class DocumentProcessor:
             print(f"Error processing URL document: {e}")
             return {'error': str(e)}
         
-    # 搜索相似文档：根据查询文本在Pinecone中搜索相似文档
-    def search_similar_documents(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """ 搜索相似文档：根据查询文本在Pinecone中搜索相似文档"""
-        try:
-            # 为查询生成嵌入向量
-            query_embedding = self.generate_embeddings([query])[0]
-            
-            # 在Pinecone中搜索相似向量
-            results = self.index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                include_metadata=True
-            )
-            
-            return results['matches']
-            
-        except Exception as e:
-            print(f"Error searching similar documents: {e}")
-            return []
-        
+    # 为查询文本生成嵌入向量，LRU缓存命中时完全跳过HTTP调用
+    def _embed_query(self, query: str) -> List[float]:
+        """为查询生成嵌入向量，带LRU缓存（聊天场景下重复查询很常见）"""
+        cached = self._query_embedding_cache.get(query)
+        if cached is not None:
+            self._query_embedding_cache.move_to_end(query)
+            return cached
+
+        embedding = self.generate_embeddings([query])[0]
+        self._query_embedding_cache[query] = embedding
+        if len(self._query_embedding_cache) > 1024:
+            self._query_embedding_cache.popitem(last=False)
+        return embedding
+
     def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings for a list of texts using SiliconFlow"""
         try:
+            # 截断文本以适应token限制（为安全起见，大约400个字符）
+            truncated_texts = [text[:400] if len(text) > 400 else text for text in texts]
+
+            # 本地后端：一次批量前向推理完成全部文本（动态padding），无网络开销
+            if self.local_embedding_model is not None:
+                return self.local_embedding_model.encode(
+                    truncated_texts, batch_size=64, convert_to_numpy=True
+                ).tolist()
+
+            # 按批次切分后并发调用嵌入API；executor.map保证结果顺序与输入一致
+            batches = [
+                truncated_texts[start:start + self.embedding_batch_size]
+                for start in range(0, len(truncated_texts), self.embedding_batch_size)
+            ]
             embeddings = []
-            for text in texts:
-                # 截断文本以适应token限制（为安全起见，大约400个字符）
-                truncated_text = text[:400] if len(text) > 400 else text
-                
-                response = self.client.embeddings.create(
-                    model="BAAI/bge-large-zh-v1.5",
-                    input=[truncated_text]
-                )
-                embeddings.append(response.data[0].embedding)
-            
+            for batch_embeddings in self._embedding_executor.map(self._embed_batch, batches):
+                embeddings.extend(batch_embeddings)
+
             return embeddings
         except Exception as e:
             print(f"Error generating embeddings: {e}")
             return []
+
+    def _embed_batch(self, batch: List[str], max_retries: int = 3) -> List[List[float]]:
+        """为一批文本生成嵌入向量，带指数退避重试，批量失败时回退到逐条调用"""
+        for attempt in range(max_retries):
+            try:
+                response = self.client.embeddings.create(
+                    model="BAAI/bge-large-zh-v1.5",
+                    input=batch
+                )
+                return [d.embedding for d in response.data]
+            except Exception as e:
+                if attempt < max_retries - 1:
+                    time.sleep(2 ** attempt)
+                else:
+                    print(f"Error embedding batch of {len(batch)} texts: {e}, falling back to per-item calls")
+
+        # 批量调用多次失败，逐条回退以尽量保住结果
+        embeddings = []
+        for text in batch:
+            response = self.client.embeddings.create(
+                model="BAAI/bge-large-zh-v1.5",
+                input=[text]
+            )
+            embeddings.append(response.data[0].embedding)
+        return embeddings
     
     def process_document(self, document_id: str) -> Dict[str, Any]:
         """Process a single document: generate embeddings and store in Pinecone"""
         try:
+            # 统一转换为ObjectId，命中_id主键索引（字符串查询匹配不到ObjectId存储的文档）
+            oid = document_id if isinstance(document_id, ObjectId) else ObjectId(document_id)
+
             # 从MongoDB获取文档
-            document = self.documents_collection.find_one({'_id': document_id})
+            document = self.documents_collection.find_one({'_id': oid})
             if not document:
                 return {'error': f'Document {document_id} not found'}
             
@@ -374,12 +507,13 @@ class DocumentProcessor:
                     'document_id': document_id,
                     'chunk_index': i,
                     'content': chunk,
-                    'embedding': embedding,
+                    # float32二进制存储，体积仅为浮点列表的一半左右（检索走Pinecone，Mongo仅留档）
+                    'embedding': Binary(np.asarray(embedding, dtype=np.float32).tobytes()),
                     'created_at': datetime.utcnow()
                 })
             
-            # 上传到Pinecone
-            self.index.upsert(vectors=vectors_to_upsert)
+            # 分批上传到Pinecone
+            self._upsert_in_batches(vectors_to_upsert)
             
             # 存储到MongoDB
             if vector_records:
@@ -387,7 +521,7 @@ class DocumentProcessor:
             
             # 更新文档状态
             self.documents_collection.update_one(
-                {'_id': document_id},
+                {'_id': oid},
                 {
                     '$set': {
                         'vectorized': True,
@@ -413,8 +547,8 @@ class DocumentProcessor:
     def search_similar_documents(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """Search for similar documents using vector similarity"""
         try:
-            # 为查询生成嵌入向量
-            query_embedding = self.generate_embeddings([query])[0]
+            # 为查询生成嵌入向量（重复查询命中缓存）
+            query_embedding = self._embed_query(query)
             
             # 在Pinecone中搜索
             search_results = self.index.query(
@@ -440,17 +574,24 @@ class DocumentProcessor:
             print(f"Error searching documents: {e}")
             return []
     
-    def get_unprocessed_documents(self) -> List[Dict[str, Any]]:
-        """Get list of documents that haven't been vectorized yet"""
+    def count_unprocessed_documents(self) -> int:
+        """Count documents that haven't been vectorized yet"""
+        try:
+            return self.documents_collection.count_documents({'vectorized': {'$ne': True}})
+        except Exception as e:
+            print(f"Error counting unprocessed documents: {e}")
+            return 0
+
+    def get_unprocessed_documents(self) -> Iterator[Dict[str, Any]]:
+        """Yield documents that haven't been vectorized yet, streaming from the cursor"""
         try:
-            cursor = self.documents_collection.find(
+            # 逐批从游标流式读取，调用方拿到第一条即可开始处理，无需整表载入内存
+            yield from self.documents_collection.find(
                 {'vectorized': {'$ne': True}},
                 {'_id': 1, 'filename': 1, 'uploadedAt': 1}
-            )
-            return list(cursor)
+            ).batch_size(200)
         except Exception as e:
             print(f"Error getting unprocessed documents: {e}")
-            return []
 
 # 主函数：从命令行处理文档
 def main():
@@ -479,10 +620,9 @@ def main():
         print(json.dumps(result, indent=2))
     
     elif command == 'process_all':
-        unprocessed = processor.get_unprocessed_documents()
-        print(f"Found {len(unprocessed)} unprocessed documents")
-        
-        for doc in unprocessed:
+        print(f"Found {processor.count_unprocessed_documents()} unprocessed documents")
+
+        for doc in processor.get_unprocessed_documents():
             print(f"Processing {doc['filename']}...")
             result = processor.process_document(doc['_id'])
             print(json.dumps(result, indent=2))
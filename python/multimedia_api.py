@@ -1,14 +1,18 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Query
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+import asyncio
+import functools
 import os
 import tempfile
-import shutil
+import aiofiles
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from multimedia_processor import MultimediaProcessor
+from pymongo import AsyncMongoClient
 import logging
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 import json
 from bson import ObjectId
 from bson.errors import InvalidId
@@ -17,7 +21,8 @@ from bson.errors import InvalidId
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="多媒体处理API", version="1.0.0")
+# orjson序列化大响应（文档列表、搜索结果）比标准json快数倍
+app = FastAPI(title="多媒体处理API", version="1.0.0", default_response_class=ORJSONResponse)
 
 # 添加CORS中间件
 app.add_middleware(
@@ -29,13 +34,41 @@ app.add_middleware(
 )
 
 # 初始化多媒体处理器
+# 搜索请求是网络密集型（嵌入API + Pinecone），用独立线程池支撑并发搜索
+SEARCH_POOL = ThreadPoolExecutor(max_workers=32)
+
+SUPPORTED_TYPES: Optional[Dict[str, Any]] = None
+
 try:
     multimedia_processor = MultimediaProcessor()
+    # 文档列表按上传时间排序，建立索引避免内存排序
+    multimedia_processor.collection.create_index([('uploadedAt', -1)], background=True)
+    # 支持的文件类型在运行期不变，启动时缓存一次供/health与/supported-types复用
+    SUPPORTED_TYPES = multimedia_processor.get_supported_types()
     logger.info("多媒体处理器初始化成功")
 except Exception as e:
     logger.error(f"多媒体处理器初始化失败: {str(e)}")
     multimedia_processor = None
 
+# API层自身的Mongo操作走异步客户端，往返期间释放事件循环而非占用线程
+# 池大小按预期并发请求量级设置，而非任意调大
+async_mongo_client = AsyncMongoClient(
+    os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'),
+    maxPoolSize=50,
+    minPoolSize=5,
+)
+async_db = async_mongo_client['allpassagent']
+async_docs_collection = async_db['multimedia_docs']
+async_chunks_collection = async_db['multimedia_chunks']
+
+# openapi.json内容固定，启动时读入内存，避免每次请求的磁盘读取
+try:
+    with open("openapi.json") as f:
+        OPENAPI_SCHEMA = json.load(f)
+except Exception as e:
+    logger.warning(f"加载openapi.json失败: {str(e)}")
+    OPENAPI_SCHEMA = {}
+
 # Pydantic模型
 class ProcessResponse(BaseModel):
     success: bool
@@ -66,8 +99,7 @@ class SearchResponse(BaseModel):
 
 @app.get("/openapi.json", include_in_schema=False)
 async def get_openapi_schema():
-    with open("openapi.json") as f:
-        return JSONResponse(json.load(f))
+    return JSONResponse(OPENAPI_SCHEMA)
 
 @app.get("/")
 async def root():
@@ -81,21 +113,38 @@ async def health_check():
     
     return {
         "status": "healthy",
-        "supported_types": multimedia_processor.get_supported_types()
+        "supported_types": SUPPORTED_TYPES
     }
 
+def _filename_from_headers(request: Request) -> Optional[str]:
+    """从Content-Disposition或X-Filename头中解析原始文件名（原始流上传路径）"""
+    disposition = request.headers.get('content-disposition', '')
+    for part in disposition.split(';'):
+        part = part.strip()
+        if part.startswith('filename='):
+            return part[len('filename='):].strip('"') or None
+    return request.headers.get('x-filename')
+
 @app.post("/upload", response_model=ProcessResponse)
-async def upload_multimedia_file(file: UploadFile = File(...)):
+async def upload_multimedia_file(request: Request, file: Optional[UploadFile] = File(None)):
     """
     上传并处理多媒体文件
+
+    支持两种上传方式：multipart表单（file字段），或原始二进制流
+    （文件名放在Content-Disposition/X-Filename头）。大文件建议用原始流，
+    绕过multipart解析的SpooledTemporaryFile缓冲，省掉一次整文件磁盘拷贝。
     """
     if multimedia_processor is None:
         raise HTTPException(status_code=503, detail="多媒体处理器未初始化")
 
     temp_file_path = None
     try:
+        filename = file.filename if file is not None else _filename_from_headers(request)
+        if not filename:
+            raise HTTPException(status_code=400, detail="缺少文件名（file字段或Content-Disposition头）")
+
         # 检查文件类型
-        file_ext = os.path.splitext(file.filename)[1].lower()
+        file_ext = os.path.splitext(filename)[1].lower()
         file_type = multimedia_processor.get_file_type(file_ext)
 
         if not file_type:
@@ -105,34 +154,48 @@ async def upload_multimedia_file(file: UploadFile = File(...)):
                 error=f"文件类型 {file_ext} 不受支持"
             )
 
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
-            shutil.copyfileobj(file.file, temp_file)
-            temp_file_path = temp_file.name
+        # 创建临时文件，按块异步写入磁盘（不经事件循环线程的阻塞IO）
+        fd, temp_file_path = tempfile.mkstemp(suffix=file_ext)
+        os.close(fd)
+        async with aiofiles.open(temp_file_path, 'wb') as out_file:
+            if file is not None:
+                while chunk := await file.read(1 << 20):
+                    await out_file.write(chunk)
+            else:
+                # 请求体直接流式落盘，全程只写一次
+                async for chunk in request.stream():
+                    if chunk:
+                        await out_file.write(chunk)
 
         # 1. 创建文档记录并获取doc_id
-        doc_id = multimedia_processor.create_document_record(file.filename, temp_file_path, file_type)
+        doc_id = await asyncio.to_thread(
+            multimedia_processor.create_document_record, filename, temp_file_path, file_type
+        )
 
-        # 2. 根据文件类型调用不同的处理方法
+        # 2. 根据文件类型调用不同的处理方法（同步阻塞的处理器放入线程池，不阻塞事件循环）
         content_data = []
         if file_type == 'video':
-            content_data = multimedia_processor.process_video(temp_file_path)
+            content_data = await asyncio.to_thread(multimedia_processor.process_video, temp_file_path)
         elif file_type == 'image':
-            content_data = multimedia_processor.process_image(temp_file_path)
+            content_data = await asyncio.to_thread(multimedia_processor.process_image, temp_file_path)
         elif file_type == 'audio':
-            content_data = multimedia_processor.process_audio(temp_file_path)
+            content_data = await asyncio.to_thread(multimedia_processor.process_audio, temp_file_path)
         elif file_type == 'ppt':
-            content_data = multimedia_processor.process_ppt(temp_file_path, doc_id)
+            content_data = await asyncio.to_thread(multimedia_processor.process_ppt, temp_file_path)
         elif file_type in ['document', 'pdf', 'word', 'excel', 'text', 'markdown', 'html']:
-            content_data = multimedia_processor.process_document_with_raganything(temp_file_path)
+            content_data = await asyncio.to_thread(
+                multimedia_processor.process_document_with_raganything, temp_file_path
+            )
         else:
             # 作为备用，对于未明确处理的类型，也尝试通用文档解析
             logger.warning(f"未找到针对 '{file_type}' 的特定处理器，将使用通用文档解析器。")
-            content_data = multimedia_processor.process_document_with_raganything(temp_file_path)
+            content_data = await asyncio.to_thread(
+                multimedia_processor.process_document_with_raganything, temp_file_path
+            )
 
         if not content_data:
             # 如果没有提取到内容，也更新文档状态
-            multimedia_processor.collection.update_one(
+            await async_docs_collection.update_one(
                 {'_id': doc_id},
                 {'$set': {'status': 'failed', 'error': '未能从文件中提取任何内容', 'updatedAt': datetime.now()}}
             )
@@ -143,15 +206,16 @@ async def upload_multimedia_file(file: UploadFile = File(...)):
             )
 
         # 3. 存储提取的内容
-        multimedia_processor.store_multimedia_content(
+        await asyncio.to_thread(
+            multimedia_processor.store_multimedia_content,
             doc_id=doc_id,
-            filename=file.filename,
+            filename=filename,
             content_data=content_data,
             file_type=file_type
         )
         
         # 4. 更新文档状态为成功
-        multimedia_processor.collection.update_one(
+        await async_docs_collection.update_one(
             {'_id': doc_id},
             {'$set': {'status': 'completed', 'updatedAt': datetime.now()}}
         )
@@ -164,12 +228,15 @@ async def upload_multimedia_file(file: UploadFile = File(...)):
             file_type=file_type
         )
 
+    except HTTPException:
+        # 主动抛出的状态码（如400缺文件名）原样返回，不落入通用500
+        raise
     except Exception as e:
         logger.error(f"上传文件处理出错: {str(e)}")
         # 如果发生异常，也尝试更新文档状态
         doc_id_val = locals().get('doc_id')
         if doc_id_val:
-            multimedia_processor.collection.update_one(
+            await async_docs_collection.update_one(
                 {'_id': doc_id_val},
                 {'$set': {'status': 'failed', 'error': str(e), 'updatedAt': datetime.now()}}
             )
@@ -193,10 +260,15 @@ async def search_multimedia_content(request: SearchRequest):
         raise HTTPException(status_code=503, detail="多媒体处理器未初始化")
     
     try:
-        results = multimedia_processor.search_multimedia_content(
-            query=request.query,
-            file_types=request.file_types,
-            top_k=request.top_k
+        # 搜索内部是阻塞的嵌入+Pinecone网络调用，放入专用线程池避免阻塞事件循环
+        results = await asyncio.get_running_loop().run_in_executor(
+            SEARCH_POOL,
+            functools.partial(
+                multimedia_processor.search_multimedia_content,
+                query=request.query,
+                file_types=request.file_types,
+                top_k=request.top_k
+            )
         )
         
         search_results = [
@@ -256,7 +328,7 @@ async def get_supported_types():
         raise HTTPException(status_code=503, detail="多媒体处理器未初始化")
     
     return {
-        "supported_types": multimedia_processor.get_supported_types(),
+        "supported_types": SUPPORTED_TYPES,
         "description": {
             "ppt": "PowerPoint演示文稿，支持文本提取和图片OCR",
             "image": "图片文件，支持OCR文字识别和内容描述",
@@ -266,16 +338,37 @@ async def get_supported_types():
     }
 
 @app.get("/documents")
-async def get_all_documents():
+async def get_all_documents(
+    limit: int = Query(50, ge=1, le=200, description="每页返回的文档数量"),
+    before_id: Optional[str] = Query(None, description="游标分页：返回此文档ID之前的文档")
+):
     """
-    获取所有文档的列表
+    获取文档列表（基于_id游标分页，避免全表扫描和整库传输）
     """
     if multimedia_processor is None:
         raise HTTPException(status_code=503, detail="多媒体处理器未初始化")
-    
+
     try:
-        documents = list(multimedia_processor.collection.find({}).sort("uploadedAt", -1))
-        
+        query_filter = {}
+        if before_id:
+            try:
+                query_filter['_id'] = {'$lt': ObjectId(before_id)}
+            except InvalidId:
+                raise HTTPException(status_code=400, detail=f"无效的游标ID格式: {before_id}")
+
+        # 只投影列表页需要的字段，按_id倒序（与插入时间序一致）分页
+        projection = {
+            'filename': 1, 'file_type': 1, 'status': 1, 'uploadedAt': 1,
+            'size': 1, 'type': 1, 'chunkCount': 1
+        }
+        documents = await (
+            async_docs_collection
+            .find(query_filter, projection)
+            .sort('_id', -1)
+            .limit(limit)
+            .to_list(length=limit)
+        )
+
         for doc in documents:
             doc["_id"] = str(doc["_id"])
             doc["size"] = doc.get("size", 0)
@@ -288,6 +381,9 @@ async def get_all_documents():
             "success": True,
             "documents": documents
         }
+    except HTTPException:
+        # 游标格式错误等主动抛出的400原样返回，不包装成500
+        raise
     except Exception as e:
         logger.error(f"获取文档列表出错: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取文档列表失败: {str(e)}")
@@ -307,16 +403,16 @@ async def delete_document(doc_id: str = Query(..., description="要删除的文
         except InvalidId:
             raise HTTPException(status_code=400, detail=f"无效的文档ID格式: {doc_id}")
 
-        # 从MongoDB删除文档记录
-        doc_result = multimedia_processor.collection.delete_one({'_id': obj_id})
-        
+        # MongoDB文档、内容块与Pinecone向量并发删除，总耗时为三者中的最大值而非总和
+        doc_result, chunks_result, _ = await asyncio.gather(
+            async_docs_collection.delete_one({'_id': obj_id}),
+            async_chunks_collection.delete_many({'doc_id': doc_id}),
+            asyncio.to_thread(multimedia_processor.index.delete, filter={'doc_id': doc_id})
+        )
+
         if doc_result.deleted_count == 0:
             raise HTTPException(status_code=404, detail=f"未找到文档 {doc_id}")
 
-        chunks_result = multimedia_processor.chunks_collection.delete_many({'doc_id': doc_id})
-        
-        # Pinecone中的向量将通过doc_id进行元数据过滤，无需手动删除
-        
         return {
             "success": True,
             "message": f"成功删除文档 {doc_id}",
@@ -4,18 +4,54 @@ import json
 import argparse
 import hashlib
 import shutil
+import queue
 import subprocess
 import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Union
 
+import numpy as np
+
 # ---- 可选：OpenAI embeddings ----
 try:
     from openai import OpenAI
 except Exception:
     OpenAI = None
 
+
+def _iter_content_list(json_path: str):
+    """
+    逐条迭代MinerU的content_list.json：大PDF的该文件可达几十MB，
+    装了ijson就流式解析（峰值内存只有单个条目），否则退回整体json.load
+    """
+    try:
+        import ijson
+    except ImportError:
+        with open(json_path, 'r', encoding='utf-8') as jf:
+            yield from json.load(jf)
+        return
+    with open(json_path, 'rb') as jf:
+        yield from ijson.items(jf, 'item')
+
+
+def _fast_tmp_dir(min_free_bytes: int = 500 * 1024 * 1024) -> Optional[str]:
+    """
+    MinerU会写大量中间JSON/图片，放到/dev/shm（tmpfs，纯内存）可免去磁盘
+    写回路径；空间不足或平台没有tmpfs时返回None，走系统默认临时目录
+    """
+    shm = '/dev/shm'
+    try:
+        st = os.statvfs(shm)
+        if st.f_bavail * st.f_bsize > min_free_bytes:
+            return shm
+    except (OSError, AttributeError):
+        pass
+    return None
+
+
 class RAGOrchestrator:
     def __init__(self, config: Dict[str, Any] = None):
         """
@@ -84,17 +120,88 @@ class RAGOrchestrator:
 
         return doc_id
 
-    def retrieve(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    def process_documents(self, documents: List[tuple]) -> List[Optional[str]]:
+        """
+        多文档流水线摄取。documents 为 (source, metadata) 列表。
+        解析、向量化、存储三个阶段各占一个线程，经容量为2的有界队列
+        衔接：解析第N+1份文档时，第N份在向量化、第N-1份在入库，
+        整体吞吐取决于最慢阶段而非三段之和。有界队列兼做背压，
+        避免解析跑太快把所有块堆在内存里。
+        单份文档失败只记录不中断流水线，对应位置返回None；
+        返回的doc_id列表与输入顺序一致。
+        """
+        if not documents:
+            return []
+        results: List[Optional[str]] = [None] * len(documents)
+        parse_q: queue.Queue = queue.Queue(maxsize=2)
+        embed_q: queue.Queue = queue.Queue(maxsize=2)
+        _end = object()
+
+        def _vectorize_stage():
+            while True:
+                item = parse_q.get()
+                if item is _end:
+                    embed_q.put(_end)
+                    return
+                idx, chunks, metadata = item
+                try:
+                    vectors = self.vectorizer.vectorize(chunks)
+                except Exception as e:
+                    print(f"Vectorize failed for document {idx}: {e}")
+                    continue
+                embed_q.put((idx, chunks, vectors, metadata))
+
+        def _store_stage():
+            while True:
+                item = embed_q.get()
+                if item is _end:
+                    return
+                idx, chunks, vectors, metadata = item
+                try:
+                    results[idx] = self.storer.store(chunks, vectors, metadata)
+                except Exception as e:
+                    print(f"Store failed for document {idx}: {e}")
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            vec_future = pool.submit(_vectorize_stage)
+            store_future = pool.submit(_store_stage)
+            for idx, (source, metadata) in enumerate(documents):
+                try:
+                    chunks = self.parser.parse(source, metadata)
+                except Exception as e:
+                    print(f"Parse failed for document {idx}: {e}")
+                    continue
+                parse_q.put((idx, chunks, metadata))
+            parse_q.put(_end)
+            vec_future.result()
+            store_future.result()
+        return results
+
+    def retrieve(self, query: str, top_k: int = 5,
+                 filters: Optional[Dict[str, Any]] = None,
+                 query_vector: Optional[List[float]] = None) -> List[Dict[str, Any]]:
         """
         根据查询检索相关文档块。
-        1. 使用向量化器为查询生成嵌入向量。
-        2. 使用检索器从数据库中查找最相似的 top_k 个块。
+        1. 使用向量化器为查询生成嵌入向量（调用方已有向量时可直接传入，避免重复嵌入）。
+        2. 使用检索器从数据库中查找最相似的 top_k 个块，可按元数据过滤。
         返回检索到的块列表。
         """
-        query_vector = self.vectorizer.vectorize_query(query)
-        results = self.retriever.retrieve(query_vector, top_k)
+        if query_vector is None:
+            query_vector = self.vectorizer.vectorize_query(query)
+        results = self.retriever.retrieve(query_vector, top_k, filters=filters)
         return results
 
+    def retrieve_many(self, queries: List[str], top_k: int = 5,
+                      filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        批量检索多个查询（如多路查询扩展）。所有查询一次批量嵌入，
+        Pinecone查询并发下发，整体延迟接近单个查询而非查询数的线性叠加。
+        """
+        if not queries:
+            return []
+        query_vectors = self.vectorizer.vectorize_queries(queries)
+        return self.retriever.retrieve_batch(query_vectors, top_k, filters=filters)
+
 # --- 子组件接口 (待实现) ---
 
 class Parser:
@@ -189,11 +296,21 @@ class RagAnythingParser(Parser):
 
     def _parse_with_mineru(self, file_path: str) -> List[Dict[str, Any]]:
         content_data: List[Dict[str, Any]] = []
-        with tempfile.TemporaryDirectory() as tmpdir:
+        with tempfile.TemporaryDirectory(dir=_fast_tmp_dir()) as tmpdir:
             cmd = ['mineru', '-p', file_path, '-o', tmpdir, '-m', 'auto']
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            # stdout是MinerU的大量进度输出，直接丢弃省掉整段读取+UTF-8解码；
+            # stderr保留字节形式，只在失败时才解码。
+            # OCR路径可能临时设置OMP_THREAD_LIMIT=1，MinerU的torch推理
+            # 依赖OpenMP多线程，显式从子进程环境剔除该限制
+            env = os.environ.copy()
+            env.pop('OMP_THREAD_LIMIT', None)
+            result = subprocess.run(
+                cmd, stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                env=env
+            )
             if result.returncode != 0:
-                raise RuntimeError(f"MinerU解析失败: {result.stderr}")
+                raise RuntimeError(f"MinerU解析失败: {result.stderr.decode('utf-8', errors='replace')}")
             # 查找输出
             content_json_path = None
             for root, _, files in os.walk(tmpdir):
@@ -205,9 +322,7 @@ class RagAnythingParser(Parser):
                     break
             if not content_json_path:
                 raise FileNotFoundError('未找到 MinerU 输出的 content_list.json')
-            with open(content_json_path, 'r', encoding='utf-8') as jf:
-                content_list = json.load(jf)
-            for idx, item in enumerate(content_list):
+            for idx, item in enumerate(_iter_content_list(content_json_path)):
                 block_type = item.get('type', 'text')
                 page_idx = item.get('page_idx')
                 page_number = (page_idx + 1) if isinstance(page_idx, int) else None
@@ -231,10 +346,14 @@ class Chunker:
 class Vectorizer:
     def vectorize(self, chunks: List[Dict[str, Any]]) -> List[List[float]]:
         raise NotImplementedError
-    
+
     def vectorize_query(self, query: str) -> List[float]:
         raise NotImplementedError
 
+    def vectorize_queries(self, queries: List[str]) -> List[List[float]]:
+        # 默认逐条嵌入；支持批量接口的实现应覆盖为单次调用
+        return [self.vectorize_query(q) for q in queries]
+
 class OpenAIVectorizer(Vectorizer):
     def __init__(self, model: str = 'text-embedding-3-small'):
         if not OpenAI:
@@ -244,16 +363,131 @@ class OpenAIVectorizer(Vectorizer):
             raise RuntimeError('未检测到 OPENAI_API_KEY 或 SILICONFLOW_API_KEY 环境变量。')
         self.client = OpenAI(api_key=api_key)
         self.model = model
+        # 进程内LRU：同进程重复文本（页眉、固定段落）直接命中，不走网络
+        self._embed_cache: 'OrderedDict[str, List[float]]' = OrderedDict()
+        self._embed_cache_size = 4096
+        # 持久缓存：按内容哈希存入Mongo（与ocr_cache同一套路），重跑同批
+        # 文档时近乎全命中；Mongo不可达时静默降级为仅进程内缓存
+        try:
+            from pymongo import MongoClient
+            mongo = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'),
+                                serverSelectionTimeoutMS=2000)
+            self._cache_collection = mongo['allpassagent']['embedding_cache']
+            self._cache_collection.create_index('hash', unique=True)
+        except Exception:
+            self._cache_collection = None
 
-    def vectorize(self, chunks: List[Dict[str, Any]]) -> List[List[float]]:
+    def vectorize(self, chunks: List[Dict[str, Any]]) -> List[np.ndarray]:
+        # 返回float32 ndarray而非Python list：1536维向量6KB而非约45KB的
+        # 装箱浮点，序列化也更快；到Pinecone上传边界再.tolist()
         texts = [self._build_embedding_text(chunk) for chunk in chunks]
-        response = self.client.embeddings.create(input=texts, model=self.model)
-        return [embedding.embedding for embedding in response.data]
+        return self._embed_texts(texts)
+
+    def _cache_key(self, text: str) -> str:
+        # 键含模型名：换模型后不会串用旧向量
+        return hashlib.sha256((self.model + "\0" + text).encode('utf-8')).hexdigest()
+
+    def _cache_lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        for key in keys:
+            if key in self._embed_cache:
+                self._embed_cache.move_to_end(key)
+                found[key] = self._embed_cache[key]
+        remaining = [k for k in keys if k not in found]
+        if remaining and self._cache_collection is not None:
+            try:
+                for doc in self._cache_collection.find({'hash': {'$in': remaining}}):
+                    embedding = np.asarray(doc['embedding'], dtype=np.float32)
+                    found[doc['hash']] = embedding
+                    self._cache_put_local(doc['hash'], embedding)
+            except Exception:
+                pass
+        return found
+
+    def _cache_put_local(self, key: str, embedding: List[float]):
+        self._embed_cache[key] = embedding
+        self._embed_cache.move_to_end(key)
+        while len(self._embed_cache) > self._embed_cache_size:
+            self._embed_cache.popitem(last=False)
+
+    def _cache_store(self, entries: List[tuple]):
+        for key, embedding in entries:
+            self._cache_put_local(key, embedding)
+        if entries and self._cache_collection is not None:
+            try:
+                from pymongo import UpdateOne
+                self._cache_collection.bulk_write(
+                    [UpdateOne({'hash': key}, {'$set': {'embedding': embedding.tolist()}}, upsert=True)
+                     for key, embedding in entries],
+                    ordered=False
+                )
+            except Exception:
+                pass
+
+    def _embed_texts(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        先查缓存并做调用内去重（同一文本只嵌入一次），未命中的才发API。
+        返回向量与输入顺序严格一致。
+        """
+        if not texts:
+            return []
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        key_to_positions: 'OrderedDict[str, List[int]]' = OrderedDict()
+        for i, t in enumerate(texts):
+            key_to_positions.setdefault(self._cache_key(t), []).append(i)
+        cached = self._cache_lookup(list(key_to_positions))
+        miss = []
+        for key, positions in key_to_positions.items():
+            if key in cached:
+                for pos in positions:
+                    vectors[pos] = cached[key]
+            else:
+                miss.append((key, positions))
+        if miss:
+            embedded = self._embed_uncached([texts[positions[0]] for _, positions in miss])
+            new_entries = []
+            for (key, positions), vec in zip(miss, embedded):
+                for pos in positions:
+                    vectors[pos] = vec
+                new_entries.append((key, vec))
+            self._cache_store(new_entries)
+        return vectors
+
+    def _embed_uncached(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        分批嵌入：热路径是网络往返而非CPU。提交前按文本长度排序再切批，
+        同批文本长度相近（接口按批内最长token数填充计费，长短混批拖慢
+        整批）；单批放大到256条减少往返次数，多批时经线程池并发下发
+        （最多8路在途），返回时按原始下标散射回填，与输入顺序严格一致
+        """
+        batch_size = 256
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = [order[start:start + batch_size]
+                   for start in range(0, len(order), batch_size)]
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+
+        def _embed_batch(indices):
+            response = self.client.embeddings.create(
+                input=[texts[i] for i in indices], model=self.model)
+            for pos, d in zip(indices, response.data):
+                vectors[pos] = np.asarray(d.embedding, dtype=np.float32)
+
+        if len(batches) == 1:
+            _embed_batch(batches[0])
+        else:
+            with ThreadPoolExecutor(max_workers=min(8, len(batches))) as pool:
+                list(pool.map(_embed_batch, batches))
+        return vectors
 
     def vectorize_query(self, query: str) -> List[float]:
         response = self.client.embeddings.create(input=[query], model=self.model)
         return response.data[0].embedding
 
+    def vectorize_queries(self, queries: List[str]) -> List[List[float]]:
+        # 多路查询一次批量嵌入（走缓存+去重），Pinecone的query接口要list
+        return [v.tolist() if isinstance(v, np.ndarray) else v
+                for v in self._embed_texts(list(queries))]
+
     def _build_embedding_text(self, block: Dict[str, Any]) -> str:
         t = block.get('text_content') or ''
         t = self._preprocess_text(t)
@@ -297,24 +531,25 @@ class PineconeStorer(Storer):
 
         # 2. 准备并存储块数据
         pinecone_vectors = []
+        chunk_records = []
         for i, (chunk, vector) in enumerate(zip(chunks, vectors)):
             chunk_id = f"{doc_id}_{i}"
-            
-            # 存储到 MongoDB
-            chunk_data = {
+
+            # 收集后批量写MongoDB（循环内逐条insert_one是N次往返）
+            chunk_records.append({
                 'doc_id': doc_id,
                 'chunk_id': chunk_id,
                 'text_content': chunk.get('text_content'),
                 'page_number': chunk.get('page_number'),
                 'type': chunk.get('type'),
                 'source': chunk.get('source'),
-            }
-            self.chunks_collection.insert_one(chunk_data)
+            })
 
             # 准备 Pinecone 向量
             pinecone_vectors.append({
                 'id': chunk_id,
-                'values': vector,
+                # 向量化器给的是float32 ndarray，只在上传边界转回list
+                'values': vector.tolist() if isinstance(vector, np.ndarray) else vector,
                 'metadata': {
                     'doc_id': doc_id,
                     'filename': doc_metadata.get('filename'),
@@ -322,11 +557,15 @@ class PineconeStorer(Storer):
                 }
             })
 
-        # 3. 批量上传到 Pinecone
+        # 3. 块数据一次性写入 MongoDB：1次往返替代N次，乱序写不因单条失败中断
+        if chunk_records:
+            self.chunks_collection.insert_many(chunk_records, ordered=False)
+
+        # 4. 批量上传到 Pinecone
         if pinecone_vectors:
             self.index.upsert(vectors=pinecone_vectors)
             
-        # 4. 更新主文档状态
+        # 5. 更新主文档状态
         self.collection.update_one(
             {'_id': doc_record.inserted_id},
             {'$set': {'status': 'completed', 'processed_at': datetime.now()}}
@@ -335,9 +574,14 @@ class PineconeStorer(Storer):
         return doc_id
 
 class Retriever:
-    def retrieve(self, query_vector: List[float], top_k: int) -> List[Dict[str, Any]]:
+    def retrieve(self, query_vector: List[float], top_k: int,
+                 filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         raise NotImplementedError
 
+    def retrieve_batch(self, query_vectors: List[List[float]], top_k: int,
+                       filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        return [self.retrieve(vec, top_k, filters=filters) for vec in query_vectors]
+
 class PineconeRetriever(Retriever):
     def __init__(self):
         from pinecone import Pinecone
@@ -349,13 +593,17 @@ class PineconeRetriever(Retriever):
         self.db = self.mongo_client['allpassagent']
         self.chunks_collection = self.db['multimedia_chunks']
 
-    def retrieve(self, query_vector: List[float], top_k: int) -> List[Dict[str, Any]]:
-        # 1. 从 Pinecone 检索
-        results = self.index.query(
+    def retrieve(self, query_vector: List[float], top_k: int,
+                 filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        # 1. 从 Pinecone 检索（filters为元数据过滤条件，如 {"file_type": {"$in": [...]}}）
+        query_kwargs = dict(
             vector=query_vector,
             top_k=top_k,
             include_metadata=True
         )
+        if filters:
+            query_kwargs['filter'] = filters
+        results = self.index.query(**query_kwargs)
 
         # 2. 从 MongoDB 获取完整的块内容
         chunk_ids = [match['id'] for match in results['matches']]
@@ -372,5 +620,22 @@ class PineconeRetriever(Retriever):
                     chunk_data = mongo_chunks_map[chunk_id]
                     chunk_data['score'] = match['score']
                     retrieved_chunks.append(chunk_data)
-                    
-        return retrieved_chunks
\ No newline at end of file
+
+        return retrieved_chunks
+
+    def retrieve_batch(self, query_vectors: List[List[float]], top_k: int,
+                       filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        并发执行多个向量查询：单个查询的耗时由TLS+网络往返主导，
+        串行发N个查询就要付N次RTT，线程池并发后总延迟约等于一次往返。
+        返回与query_vectors一一对应的结果列表。
+        """
+        if not query_vectors:
+            return []
+        if len(query_vectors) == 1:
+            return [self.retrieve(query_vectors[0], top_k, filters=filters)]
+        with ThreadPoolExecutor(max_workers=min(32, len(query_vectors))) as pool:
+            return list(pool.map(
+                lambda vec: self.retrieve(vec, top_k, filters=filters),
+                query_vectors
+            ))
\ No newline at end of file
@@ -20,21 +20,31 @@
 import os
 import sys
 import json
+import base64
 import argparse
 import hashlib
 import shutil
 import subprocess
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 
+import numpy as np
+
 # ---- 可选：OpenAI embeddings ----
 try:
     from openai import OpenAI
 except Exception:
     OpenAI = None
 
+# ---- 可选：orjson（JSONL落盘快5-10倍，原生支持ndarray）----
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 SUPPORTED_EXTS = {
     'document': {
         '.pdf', '.doc', '.docx', '.ppt', '.pptx', '.xls', '.xlsx',
@@ -76,13 +86,41 @@ def get_available_parsers() -> List[str]:
 
 # ---- 解析实现 ----
 
+def _iter_content_list(json_path: str):
+    """逐条迭代content_list.json：优先ijson流式解析，未安装时退回json.load"""
+    try:
+        import ijson
+    except ImportError:
+        with open(json_path, 'r', encoding='utf-8') as jf:
+            yield from json.load(jf)
+        return
+    with open(json_path, 'rb') as jf:
+        yield from ijson.items(jf, 'item')
+
+
+def _fast_tmp_dir(min_free_bytes: int = 500 * 1024 * 1024) -> Optional[str]:
+    """MinerU中间产物优先写/dev/shm（tmpfs），不可用或空间不足时走系统默认"""
+    shm = '/dev/shm'
+    try:
+        st = os.statvfs(shm)
+        if st.f_bavail * st.f_bsize > min_free_bytes:
+            return shm
+    except (OSError, AttributeError):
+        pass
+    return None
+
+
 def parse_with_mineru(file_path: str) -> List[Dict[str, Any]]:
     content_data: List[Dict[str, Any]] = []
-    with tempfile.TemporaryDirectory() as tmpdir:
+    with tempfile.TemporaryDirectory(dir=_fast_tmp_dir()) as tmpdir:
         cmd = ['mineru', '-p', file_path, '-o', tmpdir, '-m', 'auto']
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        # 丢弃stdout进度输出，stderr只在失败时解码
+        result = subprocess.run(
+            cmd, stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
         if result.returncode != 0:
-            raise RuntimeError(f"MinerU解析失败: {result.stderr}")
+            raise RuntimeError(f"MinerU解析失败: {result.stderr.decode('utf-8', errors='replace')}")
         # 查找输出
         content_json_path = None
         for root, _, files in os.walk(tmpdir):
@@ -94,9 +132,7 @@ def parse_with_mineru(file_path: str) -> List[Dict[str, Any]]:
                 break
         if not content_json_path:
             raise FileNotFoundError('未找到 MinerU 输出的 content_list.json')
-        with open(content_json_path, 'r', encoding='utf-8') as jf:
-            content_list = json.load(jf)
-        for idx, item in enumerate(content_list):
+        for idx, item in enumerate(_iter_content_list(content_json_path)):
             block_type = item.get('type', 'text')
             page_idx = item.get('page_idx')
             page_number = (page_idx + 1) if isinstance(page_idx, int) else None
@@ -197,26 +233,60 @@ def generate_embeddings(texts: List[str], model: str = 'text-embedding-3-small')
     if not api_key:
         raise RuntimeError('未检测到 OPENAI_API_KEY 或 SILICONFLOW_API_KEY 环境变量。')
     client = OpenAI(api_key=api_key)
-    vectors: List[List[float]] = []
-    # 分批调用，避免超长
-    for i in range(0, len(texts), 32):
-        batch = texts[i:i+32]
-        resp = client.embeddings.create(model=model, input=batch)
-        for d in resp.data:
-            vectors.append(d.embedding)
+    # 分批调用：先按文本长度排序再切批（同批长度相近，减少按批内最长
+    # token数填充的浪费）；单批256条减少往返次数，多批时线程池并发下发
+    # （最多8路在途），返回时按原始下标散射回填，保持与输入顺序一致
+    batch_size = 256
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    batches = [order[start:start + batch_size]
+               for start in range(0, len(order), batch_size)]
+    vectors: List[Optional[List[float]]] = [None] * len(texts)
+
+    def _embed_batch(indices):
+        resp = client.embeddings.create(model=model, input=[texts[i] for i in indices])
+        for pos, d in zip(indices, resp.data):
+            vectors[pos] = d.embedding
+
+    if len(batches) <= 1:
+        for indices in batches:
+            _embed_batch(indices)
+    else:
+        with ThreadPoolExecutor(max_workers=min(8, len(batches))) as pool:
+            list(pool.map(_embed_batch, batches))
     return vectors
 
 
+def quantize_embedding(vec: List[float]) -> Dict[str, Any]:
+    """
+    int8标量量化：按向量最大绝对值定标到[-127,127]整数，外加一个还原用
+    的scale。1536维向量落盘从约30KB的十进制文本缩到约2KB，检索质量
+    近乎无损；还原：v ≈ np.frombuffer(base64.b64decode(q), np.int8) * scale
+    """
+    v = np.asarray(vec, dtype=np.float32)
+    scale = float(np.max(np.abs(v)) / 127.0) if v.size else 1.0
+    if scale == 0.0:
+        scale = 1.0
+    q = np.round(v / scale).astype(np.int8)
+    return {'q': base64.b64encode(q.tobytes()).decode('ascii'), 'scale': scale}
+
+
 def save_jsonl(records: List[Dict[str, Any]], output_path: Path):
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for rec in records:
-            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    # 二进制写+1MB缓冲：成千上万条小记录不再每行一次write()系统调用
+    with open(output_path, 'wb', buffering=1 << 20) as f:
+        if orjson is not None:
+            opt = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE
+            for rec in records:
+                f.write(orjson.dumps(rec, option=opt))
+        else:
+            for rec in records:
+                f.write(json.dumps(rec, ensure_ascii=False).encode('utf-8') + b'\n')
 
 
 # ---- 主流程 ----
 
-def process_file(file_path: Path, parser: str, model: str, min_chars: int = 20) -> List[Dict[str, Any]]:
+def process_file(file_path: Path, parser: str, model: str, min_chars: int = 20,
+                 embedding_format: str = 'int8') -> List[Dict[str, Any]]:
     ext = file_path.suffix.lower()
     ftype = get_file_type(ext)
     if ftype not in {'document', 'ppt'}:
@@ -280,7 +350,8 @@ def process_file(file_path: Path, parser: str, model: str, min_chars: int = 20)
         records.append({
             'id': chunk_id,
             'text': text,
-            'embedding': vec,
+            # 默认int8量化落盘，--embedding-format float32 保留旧格式
+            'embedding': quantize_embedding(vec) if embedding_format == 'int8' else vec,
             'metadata': meta
         })
     return records
@@ -293,6 +364,8 @@ def main():
     parser.add_argument('--parser', default='auto', choices=['auto', 'raganything', 'mineru', 'docling'], help='解析器选择')
     parser.add_argument('--model', default='text-embedding-3-small', help='嵌入模型')
     parser.add_argument('--min-chars', type=int, default=20, help='最小文本长度过滤')
+    parser.add_argument('--embedding-format', default='int8', choices=['int8', 'float32'],
+                        help='嵌入落盘格式：int8标量量化(默认，约1/15体积)或float32原值')
     args = parser.parse_args()
 
     input_path = Path(args.input)
@@ -314,7 +387,8 @@ def main():
             continue
         print(f"处理文件: {f}")
         try:
-            recs = process_file(f, parser=args.parser, model=args.model, min_chars=args.min_chars)
+            recs = process_file(f, parser=args.parser, model=args.model, min_chars=args.min_chars,
+                                embedding_format=args.embedding_format)
             all_records.extend(recs)
         except Exception as e:
             print(f"⚠️  处理失败 {f.name}: {e}")
@@ -197,7 +197,9 @@ class RAGAnythingValidator:
             
             # 模拟依赖
             from unittest.mock import patch
+            # PineconeGRPC也要打桩：装了pinecone[grpc]时处理器优先走gRPC客户端
             with patch('multimedia_processor.Pinecone'), \
+                 patch('multimedia_processor.PineconeGRPC'), \
                  patch('multimedia_processor.MongoClient'), \
                  patch('openai.OpenAI'):
                 